@@ -1,10 +1,18 @@
 # Standard library imports
 import asyncio
+import atexit
 import functools
+import hashlib
+import itertools
 import json
+import logging
+import logging.handlers
 import os
+import queue
+import re
+import secrets
 import time
-from datetime import datetime
+from contextlib import asynccontextmanager
 from functools import wraps
 from typing import Any, Dict, List, Optional, Union
 from urllib.parse import urlparse
@@ -14,6 +22,7 @@ import httpx
 
 # Third-party imports
 import fastapi_poe as fp
+import orjson
 import tiktoken
 from fastapi import (
     Depends,
@@ -26,11 +35,12 @@ from fastapi import (
     Response,
     UploadFile,
 )
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse
 from fastapi.openapi.utils import get_openapi
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi_poe.client import get_bot_response
 from pydantic import BaseModel, Field
@@ -38,11 +48,46 @@ from pydantic import BaseModel, Field
 # Fake tool calling import
 from fake_tool_calling import FakeToolCallHandler
 
+# Log records are handed to a background thread so request handlers never block
+# on stream I/O. The listener runs for the whole process, not just the app
+# lifespan, so nothing logged outside a running app is left in the queue.
+logger = logging.getLogger("poe-bridge")
+logger.propagate = False
+_log_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# Shared HTTP client for image downloads, open while the app is running so
+# connections are reused across requests. It is not passed to fp.upload_file,
+# which closes any session it is given.
+http_client: Optional[httpx.AsyncClient] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client
+    http_client = httpx.AsyncClient(
+        timeout=120,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    )
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+        http_client = None
+
+
 # Create the FastAPI app
 app = FastAPI(
     title="Poe-API OpenAI Proxy",
     version="1.0.0",
     description="A proxy server for Poe API that provides OpenAI-compatible endpoints",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 
@@ -56,6 +101,34 @@ app.add_middleware(
 )
 
 
+_SLASHES_RE = re.compile(r"/{2,}")
+
+
+class NormalizePathMiddleware:
+    """Collapse repeated slashes and strip the optional /v1 prefix
+
+    Lets every endpoint be registered once while still answering on
+    /v1/... and //v1/... like the OpenAI clients expect.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            path = scope["path"]
+            if "//" in path:
+                path = _SLASHES_RE.sub("/", path)
+            if path == "/v1" or path.startswith("/v1/"):
+                path = path[3:] or "/"
+            if path is not scope["path"]:
+                scope = {**scope, "path": path}
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(NormalizePathMiddleware)
+
+
 class ChatMessage(BaseModel):
     role: str  # role: the role of the message, either system, user, or assistant
     content: str
@@ -126,20 +199,22 @@ class PoeAPIError(Exception):
         super().__init__(self.message)
 
 
+_ERROR_TYPES = {
+    400: "invalid_request_error",
+    401: "authentication_error",
+    403: "permission_error",
+    404: "not_found_error",
+    429: "rate_limit_error",
+    500: "server_error",
+}
+
+
 def create_error_response(
     message: str, error_type: str, status_code: int, param: Optional[str] = None
 ) -> HTTPException:
-    error_types = {
-        400: "invalid_request_error",
-        401: "authentication_error",
-        403: "permission_error",
-        404: "not_found_error",
-        429: "rate_limit_error",
-        500: "server_error",
-    }
     error = {
         "message": message,
-        "type": error_type or error_types.get(status_code, "server_error"),
+        "type": error_type or _ERROR_TYPES.get(status_code, "server_error"),
     }
     if param:
         error["param"] = param
@@ -155,6 +230,21 @@ def normalize_model(model: str):
     return model
 
 
+_BEARER_HEADERS = {"WWW-Authenticate": "Bearer"}
+_NO_TOKEN_DETAIL = {
+    "error": {
+        "message": "Authentication error: No token provided",
+        "type": "authentication_error",
+    }
+}
+_MALFORMED_AUTH_DETAIL = {
+    "error": {
+        "message": "Authentication error: Malformed Authorization header",
+        "type": "authentication_error",
+    }
+}
+
+
 # Custom HTTP Bearer authentication that returns 401 like OpenAI
 class CustomHTTPBearer(HTTPBearer):
     async def __call__(
@@ -163,39 +253,26 @@ class CustomHTTPBearer(HTTPBearer):
         authorization = request.headers.get("Authorization")
         if not authorization:
             raise HTTPException(
-                status_code=401,
-                detail={
-                    "error": {
-                        "message": "Authentication error: No token provided",
-                        "type": "authentication_error",
-                    }
-                },
-                headers={"WWW-Authenticate": "Bearer"},
+                status_code=401, detail=_NO_TOKEN_DETAIL, headers=_BEARER_HEADERS
             )
 
-        try:
-            scheme, credentials = authorization.split()
-            if scheme.lower() != "bearer":
-                raise HTTPException(
-                    status_code=401,
-                    detail={
-                        "error": {
-                            "message": f"Authentication error: Invalid scheme '{scheme}' - must be 'Bearer'",
-                            "type": "authentication_error",
-                        }
-                    },
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-        except ValueError:
+        scheme, _, credentials = authorization.strip().partition(" ")
+        credentials = credentials.lstrip()
+        if not credentials or " " in credentials:
+            raise HTTPException(
+                status_code=401, detail=_MALFORMED_AUTH_DETAIL, headers=_BEARER_HEADERS
+            )
+
+        if scheme.lower() != "bearer":
             raise HTTPException(
                 status_code=401,
                 detail={
                     "error": {
-                        "message": "Authentication error: Malformed Authorization header",
+                        "message": f"Authentication error: Invalid scheme '{scheme}' - must be 'Bearer'",
                         "type": "authentication_error",
                     }
                 },
-                headers={"WWW-Authenticate": "Bearer"},
+                headers=_BEARER_HEADERS,
             )
 
         return HTTPAuthorizationCredentials(scheme=scheme, credentials=credentials)
@@ -211,15 +288,15 @@ async def get_api_key(
     return credentials.credentials
 
 
+_ROLE_MAP = {"user": "user", "assistant": "bot", "system": "system"}
+
+
 def normalize_role(role: str):
-    if role == "user":
-        return "user"
-    elif role == "assistant":
-        return "bot"
-    elif role == "system":
-        return "system"
-    else:
-        return role
+    return _ROLE_MAP.get(role, role)
+
+
+_BOT_ERROR_RE = re.compile(r"BotError\('(.*)'\)", re.S)
+_ERROR_ID_RE = re.compile(r"error_id:\s*([^\s)]+)")
 
 
 def parse_poe_error(error: Exception) -> tuple[str, dict, str, str]:
@@ -232,36 +309,34 @@ def parse_poe_error(error: Exception) -> tuple[str, dict, str, str]:
         - Error type
         - Error ID (if available)
     """
-    error_message = str(error)
+    error_str = str(error)
+    error_message = error_str
     error_data = None
     error_type = "server_error"
     error_id = None
 
     try:
-        error_str = str(error)
-
         # Case 1: Error is a JSON object string
-        if error_str.startswith("{") and error_str.endswith("}"):
+        if error_str[:1] == "{" and error_str[-1:] == "}":
             error_data = json.loads(error_str)
             error_message = error_data.get("text", error_str)
             error_type = "poe_api_error"
 
         # Case 2: Error is BotError format with embedded JSON
-        elif "BotError('" in error_str and "')" in error_str:
-            json_part = error_str.split("BotError('", 1)[1].rsplit("')", 1)[0]
-            try:
-                error_data = json.loads(json_part)
-                error_message = error_data.get("text", error_str)
-                error_type = "poe_api_error"
-            except json.JSONDecodeError:
-                pass
+        else:
+            match = _BOT_ERROR_RE.search(error_str)
+            if match:
+                try:
+                    error_data = json.loads(match.group(1))
+                    error_message = error_data.get("text", error_str)
+                    error_type = "poe_api_error"
+                except json.JSONDecodeError:
+                    pass
 
         # Extract error_id if available
-        if "error_id:" in error_message:
-            try:
-                error_id = error_message.split("error_id:", 1)[1].strip().rstrip(")")
-            except Exception:
-                pass
+        match = _ERROR_ID_RE.search(error_message)
+        if match:
+            error_id = match.group(1)
 
         # Determine error type based on message content
         if isinstance(error, ValueError) and "Model" in error_str:
@@ -278,6 +353,15 @@ def parse_poe_error(error: Exception) -> tuple[str, dict, str, str]:
     return error_message, error_data, error_type, error_id
 
 
+_EXTENSION_MAP = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+    "application/pdf": "pdf",
+}
+
+
 async def process_base64_image(data_url: str, api_key: str) -> fp.Attachment:
     """Convert base64 data URL to Poe attachment"""
     try:
@@ -285,35 +369,31 @@ async def process_base64_image(data_url: str, api_key: str) -> fp.Attachment:
         if not data_url.startswith("data:"):
             raise ValueError("Invalid data URL format")
 
-        header, data = data_url.split(";base64,", 1)
-        mime_type = header[5:]  # Remove 'data:'
+        separator = data_url.find(";base64,")
+        if separator == -1:
+            raise ValueError("Invalid data URL format")
+        mime_type = data_url[5:separator]  # Remove 'data:'
 
         # Decode base64 data
-        file_data = base64.b64decode(data)
-
-        # Determine file extension from MIME type
-        extension_map = {
-            "image/jpeg": "jpg",
-            "image/png": "png",
-            "image/webp": "webp",
-            "image/gif": "gif",
-            "application/pdf": "pdf",
-        }
+        file_data = base64.b64decode(data_url[separator + 8 :])
 
-        extension = extension_map.get(mime_type, "bin")
-        file_name = f"uploaded_file.{extension}"
-
-        # Upload to Poe using raw bytes
-        attachment = await fp.upload_file(
-            file=file_data, file_name=file_name, api_key=api_key
-        )
-
-        return attachment
+        return await upload_file_bytes(file_data, mime_type, api_key)
 
     except Exception as e:
         raise ValueError(f"Failed to process base64 image: {str(e)}")
 
 
+async def upload_file_bytes(
+    file_data: bytes, mime_type: str, api_key: str
+) -> fp.Attachment:
+    """Upload raw file bytes to Poe as an attachment"""
+    # Determine file extension from MIME type
+    extension = _EXTENSION_MAP.get(mime_type, "bin")
+    file_name = f"uploaded_file.{extension}"
+
+    return await fp.upload_file(file=file_data, file_name=file_name, api_key=api_key)
+
+
 async def process_image_url(url: str, api_key: str) -> fp.Attachment:
     """Convert image URL to Poe attachment"""
     try:
@@ -334,68 +414,139 @@ async def convert_openai_content_to_poe(
     Returns (text_content, attachments_list)
     """
     text_parts = []
-    attachments = []
+    # (index in text_parts, url, upload coroutine)
+    uploads = []
 
     for comp in content:
-        if isinstance(comp, dict):
-            if comp.get("type") == "text" and "text" in comp:
-                text_parts.append(comp["text"])
-
-            elif comp.get("type") == "image_url":
-                image_url_obj = comp.get("image_url", {})
-                url = image_url_obj.get("url", "")
-
-                if url:
-                    try:
-                        if url.startswith("data:"):
-                            # Base64 encoded image
-                            attachment = await process_base64_image(url, api_key)
-                            attachments.append(attachment)
-                            text_parts.append(f"[Uploaded Image: {attachment.name}]")
-                        else:
-                            # External URL
-                            attachment = await process_image_url(url, api_key)
-                            attachments.append(attachment)
-                            text_parts.append(f"[Image from URL: {attachment.name}]")
-                    except ValueError as e:
-                        # Fallback to text representation if upload fails
-                        text_parts.append(f"[Image (upload failed): {url}]")
-                        print(f"Warning: {e}")
-
-            elif comp.get("type") == "image":
-                # Handle legacy "image" type
-                image_url = comp.get("image_url", "")
-                if image_url:
-                    try:
-                        if image_url.startswith("data:"):
-                            attachment = await process_base64_image(image_url, api_key)
-                            attachments.append(attachment)
-                            text_parts.append(f"[Uploaded Image: {attachment.name}]")
-                        else:
-                            attachment = await process_image_url(image_url, api_key)
-                            attachments.append(attachment)
-                            text_parts.append(f"[Image from URL: {attachment.name}]")
-                    except ValueError as e:
-                        text_parts.append(f"[Image: {image_url}]")
-                        print(f"Warning: {e}")
+        if not isinstance(comp, dict):
+            continue
+
+        if comp.get("type") == "text" and "text" in comp:
+            text_parts.append(comp["text"])
+            continue
+
+        if comp.get("type") == "image_url":
+            image_url_obj = comp.get("image_url", {})
+            url = image_url_obj.get("url", "")
+            fallback = f"[Image (upload failed): {url}]"
+        elif comp.get("type") == "image":
+            # Handle legacy "image" type
+            url = comp.get("image_url", "")
+            fallback = f"[Image: {url}]"
+        else:
+            continue
+
+        if not url:
+            continue
+
+        if url.startswith("data:"):
+            # Base64 encoded image
+            upload = process_base64_image(url, api_key)
+        else:
+            # External URL
+            upload = process_image_url(url, api_key)
+        uploads.append((len(text_parts), url, upload))
+        text_parts.append(fallback)
+
+    # Upload all images concurrently, keeping their position in the text
+    results = await asyncio.gather(
+        *(upload for _, _, upload in uploads), return_exceptions=True
+    )
+
+    attachments = []
+    for (index, url, _), result in zip(uploads, results):
+        if isinstance(result, ValueError):
+            # Keep the fallback text representation if upload fails
+            logger.warning("%s", result)
+        elif isinstance(result, BaseException):
+            raise result
+        elif url.startswith("data:"):
+            attachments.append(result)
+            text_parts[index] = f"[Uploaded Image: {result.name}]"
+        else:
+            attachments.append(result)
+            text_parts[index] = f"[Image from URL: {result.name}]"
 
     return " ".join(text_parts), attachments
 
 
+# Use cl100k_base tokenizer for all models (used by OpenAI and compatible with Claude)
+@functools.lru_cache(maxsize=1)
+def _load_cl100k() -> tiktoken.Encoding:
+    return tiktoken.get_encoding("cl100k_base")
+
+
+_ENCODING_RETRY_SECONDS = 60
+_encoding_retry_at = 0.0
+
+
+def cl100k_encoding() -> tiktoken.Encoding:
+    """Return the cl100k_base encoding, loading it on first use
+
+    A failed load (e.g. no network for the BPE file) is not cached. It is retried
+    after _ENCODING_RETRY_SECONDS, and callers fall back to an estimate meanwhile.
+    """
+    global _encoding_retry_at
+    if time.monotonic() < _encoding_retry_at:
+        raise LookupError("cl100k_base encoding is unavailable")
+    try:
+        return _load_cl100k()
+    except Exception:
+        _encoding_retry_at = time.monotonic() + _ENCODING_RETRY_SECONDS
+        raise
+
+
+_TOKEN_BATCH_MIN_MESSAGES = 16
+_TOKEN_FLUSH_CHARS = 64
+
+
 def count_tokens(text: str, model: str = None) -> int:
     """Count the number of tokens in a string using the tiktoken library
 
     Uses cl100k_base tokenizer for all models for consistency and simplicity.
+    Special tokens are not parsed since the text comes from users and bots.
     """
     try:
-        # Use cl100k_base tokenizer for all models (used by OpenAI and compatible with Claude)
-        encoding = tiktoken.get_encoding("cl100k_base")
-        return len(encoding.encode(text))
-    except Exception as e:
+        return len(cl100k_encoding().encode_ordinary(text))
+    except Exception:
         # Return an approximation if tiktoken fails
         return len(text) // 4
 
 
+class StreamTokenCounter:
+    """Counts completion tokens of a streamed response
+
+    Deltas are buffered and tokenized together once they reach
+    _TOKEN_FLUSH_CHARS characters, instead of one tokenizer call per delta.
+    """
+
+    def __init__(self):
+        self.tokens = 0
+        self.pending = []
+        self.pending_chars = 0
+
+    def add(self, text: str):
+        self.pending.append(text)
+        self.pending_chars += len(text)
+        if self.pending_chars >= _TOKEN_FLUSH_CHARS:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.tokens += count_tokens("".join(self.pending))
+            self.pending.clear()
+            self.pending_chars = 0
+
+    def reset(self):
+        self.tokens = 0
+        self.pending.clear()
+        self.pending_chars = 0
+
+    def total(self) -> int:
+        self.flush()
+        return self.tokens
+
+
 def count_message_tokens(
     messages: list[fp.ProtocolMessage], model: str = None
 ) -> Dict[str, int]:
@@ -403,18 +554,33 @@ def count_message_tokens(
 
     Uses a consistent approach for all models.
     """
-    prompt_tokens = 0
-    completion_tokens = 0
+    prompt_texts = []
+    completion_texts = []
 
     for msg in messages:
-        # Count each message based on its role
+        # Split message contents by role
         msg_content = msg.content if hasattr(msg, "content") else ""
-        token_count = count_tokens(msg_content)
 
         if msg.role == "bot" or msg.role == "assistant":
-            completion_tokens += token_count
+            completion_texts.append(msg_content)
+        else:
+            prompt_texts.append(msg_content)
+
+    texts = prompt_texts + completion_texts
+    try:
+        encoding = cl100k_encoding()
+        # encode_ordinary_batch spins up a thread pool per call, only worth it for
+        # long conversations
+        if len(texts) >= _TOKEN_BATCH_MIN_MESSAGES:
+            encoded = encoding.encode_ordinary_batch(texts, num_threads=4)
         else:
-            prompt_tokens += token_count
+            encoded = [encoding.encode_ordinary(text) for text in texts]
+        token_counts = [len(ids) for ids in encoded]
+    except Exception:
+        token_counts = [len(text) // 4 for text in texts]
+
+    prompt_tokens = sum(token_counts[: len(prompt_texts)])
+    completion_tokens = sum(token_counts[len(prompt_texts) :])
 
     # Add a small overhead for formatting (consistent with OpenAI's approach)
     prompt_tokens += 3
@@ -426,9 +592,7 @@ def count_message_tokens(
     }
 
 
-@app.post("/chat/completions")
-@app.post("/v1/chat/completions")
-@app.post("//v1/chat/completions")
+@app.post("/chat/completions", response_model=None)
 async def chat_completions(
     request: ChatCompletionRequest, api_key: str = Depends(get_api_key)
 ):
@@ -459,42 +623,38 @@ async def chat_completions(
         messages = []
         for msg in request.messages:
             role = normalize_role(msg.role)
-            content = msg.content or ""
-            attachments = []
 
-            if isinstance(content, list):
-                # Handle multimodal content with files/images
-                try:
-                    text_content, file_attachments = (
-                        await convert_openai_content_to_poe(content, api_key)
-                    )
-                    content = text_content
-                    attachments = file_attachments
-                except Exception as e:
-                    # Fallback to simple text extraction if file processing fails
-                    print(f"Warning: File processing failed: {e}")
-                    parts = []
-                    for comp in content:
-                        if isinstance(comp, dict):
-                            if comp.get("type") == "text" and "text" in comp:
-                                parts.append(comp["text"])
-                            elif comp.get("type") == "image_url":
-                                parts.append(
-                                    f"[Image: {comp.get('image_url', {}).get('url', '')}]"
-                                )
-                            elif comp.get("type") == "image":
-                                parts.append(f"[Image: {comp.get('image_url', '')}]")
-                    content = " ".join(parts)
-
-            # Create ProtocolMessage with or without attachments
-            if attachments:
+            if not isinstance(msg.content, list):
                 messages.append(
-                    fp.ProtocolMessage(
-                        role=role, content=content, attachments=attachments
-                    )
+                    fp.ProtocolMessage(role=role, content=msg.content or "")
                 )
-            else:
-                messages.append(fp.ProtocolMessage(role=role, content=content))
+                continue
+
+            # Handle multimodal content with files/images
+            attachments = []
+            try:
+                content, attachments = await convert_openai_content_to_poe(
+                    msg.content, api_key
+                )
+            except Exception as e:
+                # Fallback to simple text extraction if file processing fails
+                logger.warning("File processing failed: %s", e)
+                parts = []
+                for comp in msg.content:
+                    if isinstance(comp, dict):
+                        if comp.get("type") == "text" and "text" in comp:
+                            parts.append(comp["text"])
+                        elif comp.get("type") == "image_url":
+                            parts.append(
+                                f"[Image: {comp.get('image_url', {}).get('url', '')}]"
+                            )
+                        elif comp.get("type") == "image":
+                            parts.append(f"[Image: {comp.get('image_url', '')}]")
+                content = " ".join(parts)
+
+            messages.append(
+                fp.ProtocolMessage(role=role, content=content, attachments=attachments)
+            )
 
         # If streaming is requested, use StreamingResponse
         if request.stream:
@@ -549,7 +709,7 @@ async def chat_completions(
             "usage": token_counts,
         }
 
-        return completion_response
+        return ORJSONResponse(completion_response)
 
     except Exception as e:
 
@@ -578,7 +738,9 @@ async def chat_completions(
                 # Add error_id if available
                 if e.error_id:
                     error_detail["error"]["error_id"] = e.error_id
-                raise HTTPException(status_code=status_code, detail=error_detail)
+                return ORJSONResponse(
+                    status_code=status_code, content={"detail": error_detail}
+                )
         elif isinstance(e, ValueError):
             if "Model" in str(e):
                 status_code = 404
@@ -603,22 +765,33 @@ async def chat_completions(
                 if error_id:
                     error_detail["error"]["error_id"] = error_id
 
-                raise HTTPException(status_code=status_code, detail=error_detail)
+                return ORJSONResponse(
+                    status_code=status_code, content={"detail": error_detail}
+                )
 
         # Default error response
-        raise HTTPException(
+        return ORJSONResponse(
             status_code=status_code,
-            detail={"error": {"message": error_message, "type": error_type}},
+            content={
+                "detail": {"error": {"message": error_message, "type": error_type}}
+            },
         )
 
 
+_SSE_PREFIX = b"data: "
+_SSE_SUFFIX = b"\n\n"
+_SSE_DONE = b"data: [DONE]\n\n"
+
+
 async def stream_response(
     model: str, messages: list[fp.ProtocolMessage], api_key: str, format_type: str
 ):
     """Common streaming function for all response types"""
     model = normalize_model(model)
     first_chunk = True
-    accumulated_response = ""
+    chunk_id = os.urandom(12).hex()
+    created = int(time.time())
+    completion_counter = StreamTokenCounter()
 
     # Calculate prompt tokens before starting stream
     token_counts = count_message_tokens(messages)
@@ -627,25 +800,25 @@ async def stream_response(
         async for message in get_bot_response(
             messages=messages, bot_name=model, api_key=api_key, skip_system_prompt=True
         ):
-            chunk = await create_stream_chunk(
-                message.text, model, format_type, first_chunk
+            chunk = create_stream_chunk(
+                message.text, model, format_type, chunk_id, created, first_chunk
             )
-            accumulated_response += message.text  # Accumulate the full response text
-            yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+            completion_counter.add(message.text)
+            yield _SSE_PREFIX + orjson.dumps(chunk) + _SSE_SUFFIX
             first_chunk = False
-            await asyncio.sleep(0)  # Allow event loop to process
 
-        # Calculate completion tokens from accumulated response
-        completion_tokens = count_tokens(accumulated_response)
+        completion_tokens = completion_counter.total()
         token_counts["completion_tokens"] = completion_tokens
         token_counts["total_tokens"] = token_counts["prompt_tokens"] + completion_tokens
 
         # Send final message with token counts
-        final_chunk = await create_final_chunk(model, format_type, token_counts)
-        yield f"data: {json.dumps(final_chunk)}\n\n".encode("utf-8")
+        final_chunk = create_final_chunk(
+            model, format_type, chunk_id, created, token_counts
+        )
+        yield _SSE_PREFIX + orjson.dumps(final_chunk) + _SSE_SUFFIX
 
         if format_type in ["completion", "chat"]:
-            yield b"data: [DONE]\n\n"
+            yield _SSE_DONE
 
     except Exception as e:
 
@@ -653,9 +826,8 @@ async def stream_response(
         error_message, error_data, error_type, error_id = parse_poe_error(e)
 
         # Add token counts to error response if available
-        if accumulated_response:
-            # Calculate completion tokens from accumulated response
-            completion_tokens = count_tokens(accumulated_response)
+        completion_tokens = completion_counter.total()
+        if completion_tokens:
             token_counts["completion_tokens"] = completion_tokens
             token_counts["total_tokens"] = (
                 token_counts["prompt_tokens"] + completion_tokens
@@ -670,30 +842,30 @@ async def stream_response(
             error_data["error"]["error_id"] = error_id
 
         # Add token counts if available and we had some response before the error
-        if accumulated_response:
+        if completion_tokens:
             error_data["usage"] = token_counts
 
-        yield f"data: {json.dumps(error_data)}\n\n".encode("utf-8")
+        yield _SSE_PREFIX + orjson.dumps(error_data) + _SSE_SUFFIX
         if format_type in ["completion", "chat"]:
-            yield b"data: [DONE]\n\n"
+            yield _SSE_DONE
 
 
-async def create_stream_chunk(
+def create_stream_chunk(
     message_text: str,
     model: str,
     format_type: str,
+    chunk_id: str,
+    created: int,
     is_first_chunk: bool = False,
     is_replace_response: bool = False,
 ):
     """Common function to create streaming response chunks"""
-    chunk_id = os.urandom(12).hex()
-    timestamp = int(time.time())
 
     if format_type == "completion":
         return {
             "id": f"cmpl-{chunk_id}",
             "object": "text_completion",
-            "created": timestamp,
+            "created": created,
             "model": model,
             "choices": [
                 {
@@ -708,7 +880,7 @@ async def create_stream_chunk(
         return {
             "id": f"chatcmpl-{chunk_id}",
             "object": "chat.completion.chunk",
-            "created": timestamp,
+            "created": created,
             "model": model,
             "choices": [
                 {
@@ -732,18 +904,20 @@ async def create_stream_chunk(
         }
 
 
-async def create_final_chunk(
-    model: str, format_type: str, token_counts: Optional[Dict[str, int]] = None
+def create_final_chunk(
+    model: str,
+    format_type: str,
+    chunk_id: str,
+    created: int,
+    token_counts: Optional[Dict[str, int]] = None,
 ):
     """Common function to create final streaming chunks"""
-    chunk_id = os.urandom(12).hex()
-    timestamp = int(time.time())
 
     if format_type == "completion":
         result = {
             "id": f"cmpl-{chunk_id}",
             "object": "text_completion",
-            "created": timestamp,
+            "created": created,
             "model": model,
             "choices": [
                 {"text": "", "index": 0, "logprobs": None, "finish_reason": "stop"}
@@ -756,7 +930,7 @@ async def create_final_chunk(
         result = {
             "id": f"chatcmpl-{chunk_id}",
             "object": "chat.completion.chunk",
-            "created": timestamp,
+            "created": created,
             "model": model,
             "choices": [
                 {"index": 0, "logprobs": None, "delta": {}, "finish_reason": "stop"}
@@ -778,7 +952,9 @@ async def stream_response_with_replace(
     """Common streaming function for all response types with replace support"""
     model = normalize_model(model)
     first_chunk = True
-    accumulated_response = ""
+    chunk_id = os.urandom(12).hex()
+    created = int(time.time())
+    completion_counter = StreamTokenCounter()
 
     # Calculate prompt tokens before starting stream
     token_counts = count_message_tokens(messages)
@@ -790,40 +966,45 @@ async def stream_response_with_replace(
             api_key=api_key,
             skip_system_prompt=True,
         ):
-            # Check if message should replace previous content
-            is_replace_response = getattr(message, "is_replace_response", False)
+            is_replace_response = message.is_replace_response
 
-            # If this is a replace message, reset accumulated response
+            # If this is a replace message, reset the completion token count
             if is_replace_response:
-                accumulated_response = ""  # Reset accumulated response
+                completion_counter.reset()
 
             # Handle attachment URLs
             message_text = message.text
             if message.attachment:
                 message_text += f"\n{message.attachment.url}"
 
-            chunk = await create_stream_chunk(
-                message_text, model, format_type, first_chunk, is_replace_response
+            chunk = create_stream_chunk(
+                message_text,
+                model,
+                format_type,
+                chunk_id,
+                created,
+                first_chunk,
+                is_replace_response,
             )
 
-            # Accumulate the text (this starts fresh if we just reset)
-            accumulated_response += message_text
+            # Count the text (this starts fresh if we just reset)
+            completion_counter.add(message_text)
 
-            yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+            yield _SSE_PREFIX + orjson.dumps(chunk) + _SSE_SUFFIX
             first_chunk = False
-            await asyncio.sleep(0)  # Allow event loop to process
 
-        # Calculate completion tokens from accumulated response
-        completion_tokens = count_tokens(accumulated_response)
+        completion_tokens = completion_counter.total()
         token_counts["completion_tokens"] = completion_tokens
         token_counts["total_tokens"] = token_counts["prompt_tokens"] + completion_tokens
 
         # Send final message with token counts
-        final_chunk = await create_final_chunk(model, format_type, token_counts)
-        yield f"data: {json.dumps(final_chunk)}\n\n".encode("utf-8")
+        final_chunk = create_final_chunk(
+            model, format_type, chunk_id, created, token_counts
+        )
+        yield _SSE_PREFIX + orjson.dumps(final_chunk) + _SSE_SUFFIX
 
         if format_type in ["completion", "chat"]:
-            yield b"data: [DONE]\n\n"
+            yield _SSE_DONE
 
     except Exception as e:
 
@@ -831,9 +1012,8 @@ async def stream_response_with_replace(
         error_message, error_data, error_type, error_id = parse_poe_error(e)
 
         # Add token counts to error response if available
-        if accumulated_response:
-            # Calculate completion tokens from accumulated response
-            completion_tokens = count_tokens(accumulated_response)
+        completion_tokens = completion_counter.total()
+        if completion_tokens:
             token_counts["completion_tokens"] = completion_tokens
             token_counts["total_tokens"] = (
                 token_counts["prompt_tokens"] + completion_tokens
@@ -848,12 +1028,12 @@ async def stream_response_with_replace(
             error_data["error"]["error_id"] = error_id
 
         # Add token counts if available and we had some response before the error
-        if accumulated_response:
+        if completion_tokens:
             error_data["usage"] = token_counts
 
-        yield f"data: {json.dumps(error_data)}\n\n".encode("utf-8")
+        yield _SSE_PREFIX + orjson.dumps(error_data) + _SSE_SUFFIX
         if format_type in ["completion", "chat"]:
-            yield b"data: [DONE]\n\n"
+            yield _SSE_DONE
 
 
 # Only keep one stream_openai_format function
@@ -866,45 +1046,103 @@ async def stream_completions_format(
         yield chunk
 
 
+_COALESCE_CHARS = 256
+_COALESCE_IDLE_SECONDS = 0.01
+
+
+async def coalesce_texts(texts):
+    """Merge texts that arrive in quick succession into larger pieces
+
+    Buffered text is emitted once it reaches _COALESCE_CHARS characters or no
+    new text arrives within _COALESCE_IDLE_SECONDS. The pending read is kept
+    in a task rather than wrapped in wait_for, so an idle flush never cancels
+    the underlying stream.
+    """
+    iterator = texts.__aiter__()
+    buffer = []
+    buffered_chars = 0
+    next_text = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            if buffer:
+                done, _ = await asyncio.wait(
+                    {next_text}, timeout=_COALESCE_IDLE_SECONDS
+                )
+                if not done:
+                    yield "".join(buffer)
+                    buffer.clear()
+                    buffered_chars = 0
+                    continue
+            try:
+                text = await next_text
+            except StopAsyncIteration:
+                break
+            except Exception:
+                if buffer:
+                    yield "".join(buffer)
+                raise
+            buffer.append(text)
+            buffered_chars += len(text)
+            if buffered_chars >= _COALESCE_CHARS:
+                yield "".join(buffer)
+                buffer.clear()
+                buffered_chars = 0
+            next_text = asyncio.ensure_future(iterator.__anext__())
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        next_text.cancel()
+
+
+async def bot_response_texts(
+    model: str, messages: list[fp.ProtocolMessage], api_key: str
+):
+    async for message in get_bot_response(
+        messages=messages, bot_name=model, api_key=api_key, skip_system_prompt=True
+    ):
+        if message.attachment:
+            yield f"{message.text}\n{message.attachment.url}"
+        else:
+            yield message.text
+
+
 async def stream_completions_format_with_files(
     model: str, messages: list[fp.ProtocolMessage], api_key: str
 ):
     model = normalize_model(model)
     first_chunk = True
-    accumulated_response = ""
+    chunk_id = os.urandom(12).hex()
+    created = int(time.time())
+    completion_counter = StreamTokenCounter()
 
     token_counts = count_message_tokens(messages)
 
     try:
-        async for message in get_bot_response(
-            messages=messages, bot_name=model, api_key=api_key, skip_system_prompt=True
+        async for message_text in coalesce_texts(
+            bot_response_texts(model, messages, api_key)
         ):
-            message_text = message.text
-
-            if message.attachment:
-                message_text += f"\n{message.attachment.url}"
-
-            chunk = await create_stream_chunk(
-                message_text, model, "completion", first_chunk
+            chunk = create_stream_chunk(
+                message_text, model, "completion", chunk_id, created, first_chunk
             )
-            accumulated_response += message_text
-            yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+            completion_counter.add(message_text)
+            yield _SSE_PREFIX + orjson.dumps(chunk) + _SSE_SUFFIX
             first_chunk = False
-            await asyncio.sleep(0)
 
-        completion_tokens = count_tokens(accumulated_response)
+        completion_tokens = completion_counter.total()
         token_counts["completion_tokens"] = completion_tokens
         token_counts["total_tokens"] = token_counts["prompt_tokens"] + completion_tokens
 
-        final_chunk = await create_final_chunk("completion", "completion", token_counts)
-        yield f"data: {json.dumps(final_chunk)}\n\n".encode("utf-8")
-        yield b"data: [DONE]\n\n"
+        final_chunk = create_final_chunk(
+            "completion", "completion", chunk_id, created, token_counts
+        )
+        yield _SSE_PREFIX + orjson.dumps(final_chunk) + _SSE_SUFFIX
+        yield _SSE_DONE
 
     except Exception as e:
         error_message, error_data, error_type, error_id = parse_poe_error(e)
 
-        if accumulated_response:
-            completion_tokens = count_tokens(accumulated_response)
+        completion_tokens = completion_counter.total()
+        if completion_tokens:
             token_counts["completion_tokens"] = completion_tokens
             token_counts["total_tokens"] = (
                 token_counts["prompt_tokens"] + completion_tokens
@@ -917,27 +1155,49 @@ async def stream_completions_format_with_files(
         if error_id:
             error_data["error"]["error_id"] = error_id
 
-        if accumulated_response:
+        if completion_tokens:
             error_data["usage"] = token_counts
 
-        yield f"data: {json.dumps(error_data)}\n\n".encode("utf-8")
-        yield b"data: [DONE]\n\n"
+        yield _SSE_PREFIX + orjson.dumps(error_data) + _SSE_SUFFIX
+        yield _SSE_DONE
 
 
 # Mount the static directory
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
+@functools.lru_cache(maxsize=1)
+def index_html() -> tuple[bytes, Dict[str, str]]:
+    with open("static/index.html", "rb") as f:
+        content = f.read()
+    etag = '"' + hashlib.blake2b(content, digest_size=8).hexdigest() + '"'
+    return content, {"ETag": etag, "Cache-Control": "public, max-age=300"}
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag using weak comparison"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+
 @app.get("/", response_class=HTMLResponse)
-async def root():
-    # Serve the static HTML file
-    return FileResponse("static/index.html")
+async def root(request: Request):
+    # Serve the static HTML file from memory, letting clients revalidate by ETag
+    content, headers = index_html()
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content, headers=headers)
 
 
-@app.get("/v1/", response_class=HTMLResponse)
-async def v1_root():
-    # Also serve the same HTML file for the /v1/ endpoint
-    return FileResponse("static/index.html")
+_SERVER_ERROR_HEAD = b'{"error":{"message":'
+_SERVER_ERROR_TAIL = b',"type":"server_error"}}'
 
 
 # Simple exception handler without logging
@@ -945,7 +1205,7 @@ async def v1_root():
 async def global_exception_handler(request: Request, exc: Exception):
     # For HTTPExceptions, return their predefined responses
     if isinstance(exc, HTTPException):
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=exc.status_code,
             content=(
                 {"error": exc.detail}
@@ -954,23 +1214,21 @@ async def global_exception_handler(request: Request, exc: Exception):
             ),
         )
 
-    # For other exceptions, return a 500 error
-    return JSONResponse(
+    # For other exceptions, return a 500 error with the message spliced in
+    message = orjson.dumps(f"An unexpected error occurred: {exc}")
+    return Response(
+        content=_SERVER_ERROR_HEAD + message + _SERVER_ERROR_TAIL,
         status_code=500,
-        content={
-            "error": {
-                "message": f"An unexpected error occurred: {str(exc)}",
-                "type": "server_error",
-            }
-        },
+        media_type="application/json",
     )
 
 
-@app.get("/models")
-@app.get("/v1/models")
-@app.get("//v1/models")  # Handle double slash case like other endpoints
-async def list_models_openai():
-    # Return list of available models in OpenAI-compatible format
+_SERVER_START = int(time.time())
+
+
+@functools.lru_cache(maxsize=1)
+def models_list_body() -> bytes:
+    """Serialized model list, built once per process since it never changes"""
     model_configs = [
         {"id": "Claude-Sonnet-4", "context_window": 200000},
         {"id": "Claude-Opus-4", "context_window": 200000},
@@ -984,8 +1242,8 @@ async def list_models_openai():
         {"id": "Gemini-2.5-Pro-Exp", "context_window": 1000000},
     ]
 
-    # Create timestamp for all models
-    creation_time = int(datetime.now().timestamp())
+    # All models report the process start as their creation time
+    creation_time = _SERVER_START
 
     # Convert model configs to OpenAI-compatible model objects with limited capabilities
     model_objects = []
@@ -1019,19 +1277,41 @@ async def list_models_openai():
             }
         )
 
-    return {
-        "object": "list",
-        "data": model_objects,
-    }
+    return orjson.dumps(
+        {
+            "object": "list",
+            "data": model_objects,
+        }
+    )
+
+
+@app.get("/models", response_model=None)
+async def list_models_openai():
+    # Return list of available models in OpenAI-compatible format
+    return Response(content=models_list_body(), media_type="application/json")
 
 
-@app.post("/completions")
-@app.post("/v1/completions")
-@app.post("//v1/completions")
+_THREADED_JSON_BYTES = 64 * 1024
+
+
+async def read_json_body(request: Request) -> Any:
+    """Parse the request body with orjson, off the event loop for large payloads"""
+    raw = await request.body()
+    if len(raw) > _THREADED_JSON_BYTES:
+        return await run_in_threadpool(orjson.loads, raw)
+    return orjson.loads(raw)
+
+
+_ID_PREFIX = secrets.token_hex(6)
+_ID_COUNTER = itertools.count()
+
+
+@app.post("/completions", response_model=None)
 async def completions(request: Request, api_key: str = Depends(get_api_key)):
-    body = await request.json()
+    body = await read_json_body(request)
 
-    messages = [fp.ProtocolMessage(role="user", content=body.get("prompt", ""))]
+    prompt_text = body.get("prompt", "")
+    messages = [fp.ProtocolMessage(role="user", content=prompt_text)]
     model = body.get("model")
     stream = body.get("stream", False)
 
@@ -1045,29 +1325,35 @@ async def completions(request: Request, api_key: str = Depends(get_api_key)):
     response = await generate_poe_bot_response_with_files(model, messages, api_key)
 
     # Calculate token counts
-    prompt_tokens = count_tokens(body.get("prompt", ""))
-    completion_tokens = count_tokens(response.get("content", ""))
+    completion_text = response.get("content", "")
+    prompt_tokens = count_tokens(prompt_text)
+    completion_tokens = count_tokens(completion_text)
     token_usage = {
         "prompt_tokens": prompt_tokens,
         "completion_tokens": completion_tokens,
         "total_tokens": prompt_tokens + completion_tokens,
     }
 
-    return {
-        "id": "cmpl-" + os.urandom(12).hex(),
-        "object": "text_completion",
-        "created": int(time.time()),
-        "model": model,
-        "choices": [
-            {
-                "text": response.get("content", ""),
-                "index": 0,
-                "logprobs": None,
-                "finish_reason": "stop",
-            }
-        ],
-        "usage": token_usage,
-    }
+    return ORJSONResponse(
+        {
+            "id": f"cmpl-{_ID_PREFIX}{next(_ID_COUNTER):08x}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "text": completion_text,
+                    "index": 0,
+                    "logprobs": None,
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": token_usage,
+        }
+    )
+
+
+_DOWNLOAD_CHUNK_SIZE = 65536
 
 
 async def get_first_file_from_bot(
@@ -1086,9 +1372,72 @@ async def get_first_file_from_bot(
     return first_file
 
 
-@app.post("/images/generations")
-@app.post("/v1/images/generations")
-@app.post("//v1/images/generations")
+async def download_base64(url: str) -> str:
+    """Download a file and base64-encode it as it streams in
+
+    Chunks are encoded in multiples of 3 bytes so the pieces concatenate into
+    valid base64 without holding the whole raw file in memory.
+    """
+    encoded = bytearray()
+    remainder = b""
+    async with http_client.stream("GET", url) as response:
+        async for chunk in response.aiter_bytes(_DOWNLOAD_CHUNK_SIZE):
+            chunk = remainder + chunk
+            cut = len(chunk) - len(chunk) % 3
+            encoded += base64.b64encode(chunk[:cut])
+            remainder = chunk[cut:]
+    encoded += base64.b64encode(remainder)
+    return encoded.decode("ascii")
+
+
+async def generate_image_data(
+    model: str,
+    messages: list[fp.ProtocolMessage],
+    api_key: str,
+    response_format: Optional[str],
+) -> Optional[Dict[str, str]]:
+    """Generate one image and return it as an OpenAI image data entry"""
+    file_result = await get_first_file_from_bot(model, messages, api_key)
+    if not file_result:
+        return None
+
+    if response_format == "b64_json":
+        return {"b64_json": await download_base64(file_result.url)}
+    return {"url": file_result.url}
+
+
+async def generate_images(
+    model: str,
+    messages: list[fp.ProtocolMessage],
+    api_key: str,
+    response_format: Optional[str],
+    num_images: int,
+) -> List[Dict[str, str]]:
+    """Generate images concurrently, skipping the ones that fail"""
+    results = await asyncio.gather(
+        *(
+            generate_image_data(model, messages, api_key, response_format)
+            for _ in range(num_images)
+        ),
+        return_exceptions=True,
+    )
+
+    data = []
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            logger.warning(
+                "Error generating image %d/%d: %s", i + 1, num_images, result
+            )
+        elif isinstance(result, BaseException):
+            raise result
+        elif result is None:
+            logger.warning("Failed to generate image %d/%d", i + 1, num_images)
+        else:
+            data.append(result)
+    return data
+
+
+@app.post("/images/generations", response_model=None)
 async def image_generations(
     request: ImageGenerationRequest, api_key: str = Depends(get_api_key)
 ):
@@ -1098,33 +1447,13 @@ async def image_generations(
 
         messages = [fp.ProtocolMessage(role="user", content=request.prompt)]
 
-        # Generate multiple images by making multiple requests
-        data = []
-        successful_generations = 0
-
-        for i in range(num_images):
-            try:
-                file_result = await get_first_file_from_bot(model, messages, api_key)
-
-                if file_result:
-                    if request.response_format == "b64_json":
-                        async with httpx.AsyncClient() as client:
-                            img_response = await client.get(file_result.url)
-                            img_base64 = base64.b64encode(img_response.content).decode()
-                            data.append({"b64_json": img_base64})
-                    else:
-                        data.append({"url": file_result.url})
-
-                    successful_generations += 1
-                else:
-                    print(f"Warning: Failed to generate image {i+1}/{num_images}")
-
-            except Exception as e:
-                print(f"Warning: Error generating image {i+1}/{num_images}: {e}")
-                continue
+        # Generate multiple images by making concurrent requests
+        data = await generate_images(
+            model, messages, api_key, request.response_format, num_images
+        )
 
-        if successful_generations > 0:
-            return {"created": int(time.time()), "data": data}
+        if data:
+            return ORJSONResponse({"created": int(time.time()), "data": data})
 
     except Exception as e:
         error_message, error_data, error_type, error_id = parse_poe_error(e)
@@ -1145,9 +1474,7 @@ async def image_generations(
     )
 
 
-@app.post("/images/edits")
-@app.post("/v1/images/edits")
-@app.post("//v1/images/edits")
+@app.post("/images/edits", response_model=None)
 async def image_edits(
     image: UploadFile = File(...),
     prompt: str = Form(...),
@@ -1162,61 +1489,34 @@ async def image_edits(
         model = normalize_model(model or "StableDiffusionXL")
         num_images = max(1, min(n or 1, 10))  # Limit to reasonable range
 
-        # Read the image file and convert to base64
+        # Upload the image bytes as-is, no base64 round trip through a data URL
         image_content = await image.read()
-        image_b64 = base64.b64encode(image_content).decode()
-
-        # Create OpenAI-style multimodal content
-        openai_content = [
-            {"type": "text", "text": prompt},
-            {
-                "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"},
-            },
-        ]
-
-        # Convert OpenAI content to Poe format using existing function
-        poe_content, attachments = await convert_openai_content_to_poe(
-            openai_content, api_key
-        )
-
-        # Create ProtocolMessage with converted content and attachments
-        if attachments:
+        try:
+            attachment = await upload_file_bytes(image_content, "image/jpeg", api_key)
             messages = [
                 fp.ProtocolMessage(
-                    role="user", content=poe_content, attachments=attachments
+                    role="user",
+                    content=f"{prompt} [Uploaded Image: {attachment.name}]",
+                    attachments=[attachment],
+                )
+            ]
+        except Exception as e:
+            logger.warning("Failed to upload image: %s", e)
+            image_b64 = base64.b64encode(image_content).decode()
+            messages = [
+                fp.ProtocolMessage(
+                    role="user",
+                    content=f"{prompt} [Image (upload failed): data:image/jpeg;base64,{image_b64}]",
                 )
             ]
-        else:
-            messages = [fp.ProtocolMessage(role="user", content=poe_content)]
-
-        # Generate multiple images by making multiple requests
-        data = []
-        successful_generations = 0
-
-        for i in range(num_images):
-            try:
-                file_result = await get_first_file_from_bot(model, messages, api_key)
-
-                if file_result:
-                    if response_format == "b64_json":
-                        async with httpx.AsyncClient() as client:
-                            img_response = await client.get(file_result.url)
-                            img_base64 = base64.b64encode(img_response.content).decode()
-                            data.append({"b64_json": img_base64})
-                    else:
-                        data.append({"url": file_result.url})
-
-                    successful_generations += 1
-                else:
-                    print(f"Warning: Failed to generate image {i+1}/{num_images}")
 
-            except Exception as e:
-                print(f"Warning: Error generating image {i+1}/{num_images}: {e}")
-                continue
+        # Generate multiple images by making concurrent requests
+        data = await generate_images(
+            model, messages, api_key, response_format, num_images
+        )
 
-        if successful_generations > 0:
-            return {"created": int(time.time()), "data": data}
+        if data:
+            return ORJSONResponse({"created": int(time.time()), "data": data})
 
     except Exception as e:
         error_message, error_data, error_type, error_id = parse_poe_error(e)
@@ -1241,8 +1541,8 @@ async def generate_poe_bot_response_with_files(
     model, messages: list[fp.ProtocolMessage], api_key: str
 ):
     model = normalize_model(model)
-    accumulated_text = ""
-    received_files = []
+    text_parts = []
+    attachment_parts = []
 
     try:
         response = {"role": "assistant", "content": ""}
@@ -1253,19 +1553,17 @@ async def generate_poe_bot_response_with_files(
             api_key=api_key,
             skip_system_prompt=True,
         ):
-            is_replace_response = getattr(message, "is_replace_response", False)
-
-            if is_replace_response:
-                accumulated_text = ""
+            if message.is_replace_response:
+                text_parts.clear()
 
             # Just accumulate text, handle attachments separately
-            accumulated_text += message.text
+            text_parts.append(message.text)
 
-            # Collect attachments separately
+            # Collect attachment URLs separately so they land after the text
             if message.attachment:
-                received_files.append(message.attachment)
+                attachment_parts.append(f"\n{message.attachment.url}\n")
 
-            response["content"] = accumulated_text
+        response["content"] = "".join(text_parts + attachment_parts)
 
     except Exception as e:
         error_message, error_data, error_type, error_id = parse_poe_error(e)
@@ -1279,11 +1577,6 @@ async def generate_poe_bot_response_with_files(
 
         raise
 
-    # Add all attachment URLs at the end
-    if received_files:
-        for attachment in received_files:
-            response["content"] += f"\n{attachment.url}\n"
-
     return response
 
 
@@ -1291,7 +1584,7 @@ async def generate_poe_bot_response(
     model, messages: list[fp.ProtocolMessage], api_key: str
 ):
     model = normalize_model(model)
-    accumulated_text = ""
+    text_parts = []
 
     try:
         response = {"role": "assistant", "content": ""}
@@ -1302,16 +1595,14 @@ async def generate_poe_bot_response(
             api_key=api_key,
             skip_system_prompt=True,
         ):
-            # Check if message should replace previous content
-            is_replace_response = getattr(message, "is_replace_response", False)
-
             # If this is a replace message, reset accumulated response
-            if is_replace_response:
-                accumulated_text = ""  # Reset accumulated text
+            if message.is_replace_response:
+                text_parts.clear()
 
             # Accumulate the text (will start fresh if is_replace_response was True)
-            accumulated_text += message.text
-            response["content"] = accumulated_text
+            text_parts.append(message.text)
+
+        response["content"] = "".join(text_parts)
 
     except Exception as e:
         # Use the helper function to parse error information
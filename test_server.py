@@ -1,13 +1,28 @@
 import pytest
 from fastapi.testclient import TestClient
-from server import app, fp, normalize_model, normalize_role
+from server import (
+    StreamTokenCounter,
+    app,
+    count_message_tokens,
+    count_tokens,
+    fp,
+    normalize_model,
+    normalize_role,
+    parse_poe_error,
+)
 import asyncio
+import base64
+import httpx
 from unittest.mock import AsyncMock, patch, MagicMock
 import json
 import os
+import time
 from fastapi import HTTPException, Depends
 from typing import Dict, Any, Optional
 
+_REAL_ASYNC_CLIENT = httpx.AsyncClient
+_REAL_UPLOAD_FILE = fp.upload_file
+
 
 @pytest.fixture(autouse=True)
 def mock_all_external_calls():
@@ -39,18 +54,26 @@ def mock_all_external_calls():
             name="test-file.jpg",
         )
 
-        # Default mock for HTTP client
+        # Default mock for HTTP client, streaming back `content` in two chunks
         mock_response = MagicMock()
         mock_response.content = b"fake_http_response_data"
-        mock_client.return_value.__aenter__.return_value.get.return_value = (
+
+        async def aiter_bytes(chunk_size=None):
+            yield mock_response.content[:5]
+            yield mock_response.content[5:]
+
+        mock_response.aiter_bytes = aiter_bytes
+        mock_client.return_value.stream.return_value.__aenter__.return_value = (
             mock_response
         )
+        mock_client.return_value.aclose = AsyncMock()
 
         yield {
             "bot_response": mock_bot,
             "stream_request": mock_stream,
             "upload_file": mock_upload,
             "http_client": mock_client,
+            "http_response": mock_response,
         }
 
 
@@ -61,6 +84,36 @@ def client():
         yield test_client
 
 
+@pytest.fixture
+def mock_transport():
+    """Run the real fp.upload_file and HTTP clients against a mock transport"""
+
+    def handler(request):
+        if request.url.path.endswith("/file_upload_3RD_PARTY_POST"):
+            return httpx.Response(
+                200,
+                json={
+                    "attachment_url": "https://poe.com/uploaded.png",
+                    "mime_type": "image/png",
+                },
+            )
+        return httpx.Response(200, content=b"fake_image_data")
+
+    transport = httpx.MockTransport(handler)
+    with patch(
+        "httpx.AsyncClient",
+        side_effect=lambda **kwargs: _REAL_ASYNC_CLIENT(transport=transport, **kwargs),
+    ), patch("fastapi_poe.upload_file", _REAL_UPLOAD_FILE):
+        yield transport
+
+
+@pytest.fixture
+def transport_client(mock_transport):
+    """Test client whose shared HTTP client runs on the mock transport"""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
 @pytest.fixture
 def mock_get_bot_response(mock_all_external_calls):
     """Override default bot response for specific tests"""
@@ -113,11 +166,16 @@ def test_malformed_auth_header(client):
         "model": "Claude-3.5-Sonnet",
         "messages": [{"role": "user", "content": "Hello"}],
     }
-    headers = {"Authorization": "malformed_header"}
+    for authorization in ["malformed_header", "Bearer ", "Bearer key extra"]:
+        headers = {"Authorization": authorization}
 
-    response = client.post("/v1/chat/completions", json=request_data, headers=headers)
-    assert response.status_code == 401
-    assert "authentication_error" in response.json()["detail"]["error"]["type"]
+        response = client.post(
+            "/v1/chat/completions", json=request_data, headers=headers
+        )
+        assert response.status_code == 401
+        error = response.json()["detail"]["error"]
+        assert error["type"] == "authentication_error"
+        assert "Malformed Authorization header" in error["message"]
 
 
 def test_invalid_scheme_auth_header(client):
@@ -163,6 +221,129 @@ def test_normalize_role():
     assert normalize_role("custom") == "custom"
 
 
+def test_parse_poe_error():
+    message, data, error_type, error_id = parse_poe_error(
+        Exception('{"text": "Rate limited", "allow_retry": true}')
+    )
+    assert message == "Rate limited"
+    assert data == {"text": "Rate limited", "allow_retry": True}
+    assert error_type == "poe_api_error"
+
+    message, data, error_type, error_id = parse_poe_error(
+        Exception('BotError(\'{"text": "Internal server error (error_id: abc123)"}\')')
+    )
+    assert message == "Internal server error (error_id: abc123)"
+    assert data == {"text": "Internal server error (error_id: abc123)"}
+    assert error_type == "poe_server_error"
+    assert error_id == "abc123"
+
+    message, data, error_type, error_id = parse_poe_error(ValueError("Model not found"))
+    assert message == "Model not found"
+    assert data is None
+    assert error_type == "model_not_found"
+    assert error_id is None
+
+
+def test_logger_writes_outside_lifespan():
+    import server
+
+    with patch.object(server._log_handler, "emit") as emit:
+        server.logger.warning("Failed to process base64 image: %s", "bad data")
+        for _ in range(100):
+            if emit.called:
+                break
+            time.sleep(0.01)
+
+    record = emit.call_args.args[0]
+    assert record.getMessage() == "Failed to process base64 image: bad data"
+
+
+def test_cl100k_encoding_retried_after_failed_load():
+    """Test that a failed encoding load falls back and is retried later"""
+    import server
+
+    encoding = MagicMock()
+    encoding.encode_ordinary.return_value = [1, 2, 3]
+
+    server._load_cl100k.cache_clear()
+    try:
+        with patch.object(server, "_encoding_retry_at", 0.0), patch(
+            "tiktoken.get_encoding", side_effect=[OSError("network down"), encoding]
+        ) as get_encoding:
+            assert count_tokens("twelve chars") == 12 // 4
+            assert count_tokens("twelve chars") == 12 // 4
+            assert get_encoding.call_count == 1
+
+            server._encoding_retry_at = 0.0
+            assert count_tokens("twelve chars") == 3
+            assert count_tokens("anything") == 3
+            assert get_encoding.call_count == 2
+    finally:
+        server._load_cl100k.cache_clear()
+
+
+def test_count_message_tokens_long_conversation():
+    """Test that long conversations count the same as per-message counting"""
+    messages = [
+        fp.ProtocolMessage(
+            role="user" if i % 2 == 0 else "bot", content=f"Message number {i}"
+        )
+        for i in range(40)
+    ]
+
+    result = count_message_tokens(messages)
+
+    assert result["prompt_tokens"] == 3 + sum(
+        count_tokens(f"Message number {i}") for i in range(0, 40, 2)
+    )
+    assert result["completion_tokens"] == sum(
+        count_tokens(f"Message number {i}") for i in range(1, 40, 2)
+    )
+
+
+def test_stream_token_counter():
+    """Test that buffered deltas are tokenized together"""
+    counter = StreamTokenCounter()
+    deltas = ["Hello", ", this", " is a", " streamed", " reply"]
+
+    for delta in deltas:
+        counter.add(delta)
+
+    assert counter.total() == count_tokens("".join(deltas))
+
+
+def test_stream_token_counter_flushes_past_threshold():
+    """Test that pending text is tokenized once it crosses _TOKEN_FLUSH_CHARS"""
+    import server
+
+    counter = StreamTokenCounter()
+    first = "x" * (server._TOKEN_FLUSH_CHARS - 1)
+
+    with patch("server.count_tokens", return_value=7) as mock_count:
+        counter.add(first)
+        mock_count.assert_not_called()
+
+        counter.add("yy")
+        mock_count.assert_called_once_with(first + "yy")
+        assert counter.pending == []
+
+        counter.add("tail")
+        assert counter.total() == 14
+        assert mock_count.call_args.args == ("tail",)
+
+
+def test_stream_token_counter_reset():
+    """Test that reset discards both counted and pending text"""
+    counter = StreamTokenCounter()
+    counter.add("initial text " * 20)
+    counter.add("pending")
+
+    counter.reset()
+    counter.add("replacement text")
+
+    assert counter.total() == count_tokens("replacement text")
+
+
 def test_chat_completion_success(client, mock_get_bot_response):
     request_data = {
         "model": "Claude-3.5-Sonnet",
@@ -181,6 +362,25 @@ def test_chat_completion_success(client, mock_get_bot_response):
     assert "usage" in response_data
 
 
+def test_chat_completion_poe_error(client, mock_all_external_calls):
+    async def mock_response(*args, **kwargs):
+        raise Exception('{"text": "Bot is overloaded", "allow_retry": true}')
+        yield
+
+    mock_all_external_calls["bot_response"].side_effect = mock_response
+    request_data = {
+        "model": "Claude-3.5-Sonnet",
+        "messages": [{"role": "user", "content": "Hello"}],
+    }
+    headers = {"Authorization": "Bearer test_api_key"}
+
+    response = client.post("/v1/chat/completions", json=request_data, headers=headers)
+    assert response.status_code == 500
+    error = response.json()["detail"]["error"]
+    assert error["message"] == "Poe API Error: Bot is overloaded"
+    assert error["poe_error"]["allow_retry"] is True
+
+
 def test_chat_completion_streaming(client, mock_get_bot_response):
     request_data = {
         "model": "Claude-3.5-Sonnet",
@@ -194,6 +394,25 @@ def test_chat_completion_streaming(client, mock_get_bot_response):
     assert "text/event-stream" in response.headers["content-type"]
 
 
+def test_chat_completion_streaming_stable_id_and_created(client, mock_get_bot_response):
+    request_data = {
+        "model": "Claude-3.5-Sonnet",
+        "messages": [{"role": "user", "content": "Hello, how are you?"}],
+        "stream": True,
+    }
+    headers = {"Authorization": "Bearer test_api_key"}
+
+    response = client.post("/v1/chat/completions", json=request_data, headers=headers)
+    chunks = [
+        json.loads(line[len("data: ") :])
+        for line in response.text.splitlines()
+        if line.startswith("data: {")
+    ]
+    assert len(chunks) == 2
+    assert chunks[0]["id"] == chunks[1]["id"]
+    assert chunks[0]["created"] == chunks[1]["created"]
+
+
 def test_completions_endpoint(client, mock_get_bot_response):
     request_data = {
         "model": "Claude-3.5-Sonnet",
@@ -208,6 +427,88 @@ def test_completions_endpoint(client, mock_get_bot_response):
     assert "choices" in response_data
     assert len(response_data["choices"]) == 1
     assert response_data["choices"][0]["text"] == "Test response"
+    assert response_data["id"].startswith("cmpl-")
+
+    second = client.post("/v1/completions", json=request_data, headers=headers)
+    assert second.json()["id"] != response_data["id"]
+
+
+def test_completions_large_prompt(client, mock_get_bot_response):
+    import server
+
+    request_data = {"model": "Claude-3.5-Sonnet", "prompt": "x" * 100_000}
+    headers = {"Authorization": "Bearer test_api_key"}
+
+    with patch("server.run_in_threadpool", wraps=server.run_in_threadpool) as pool:
+        response = client.post("/v1/completions", json=request_data, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["choices"][0]["text"] == "Test response"
+    pool.assert_called_once()
+
+
+def test_completions_attachments_follow_text(client, mock_all_external_calls):
+    async def mock_response(*args, **kwargs):
+        attachment = fp.Attachment(
+            url="https://example.com/a.png", content_type="image/png", name="a.png"
+        )
+        yield fp.PartialResponse(text="Here", attachment=attachment)
+        yield fp.PartialResponse(text=" it is")
+
+    mock_all_external_calls["bot_response"].side_effect = mock_response
+    request_data = {"model": "Claude-3.5-Sonnet", "prompt": "Draw"}
+    headers = {"Authorization": "Bearer test_api_key"}
+
+    response = client.post("/v1/completions", json=request_data, headers=headers)
+    assert response.status_code == 200
+    text = response.json()["choices"][0]["text"]
+    assert text == "Here it is\nhttps://example.com/a.png\n"
+
+
+def test_completions_streaming_error_usage(client, mock_all_external_calls):
+    async def mock_response(*args, **kwargs):
+        yield fp.PartialResponse(text="Partial answer")
+        raise Exception("Connection lost")
+
+    mock_all_external_calls["bot_response"].side_effect = mock_response
+    request_data = {
+        "model": "Claude-3.5-Sonnet",
+        "prompt": "Hello, how are you?",
+        "stream": True,
+    }
+    headers = {"Authorization": "Bearer test_api_key"}
+
+    response = client.post("/v1/completions", json=request_data, headers=headers)
+    chunks = [
+        json.loads(line[len("data: ") :])
+        for line in response.text.splitlines()
+        if line.startswith("data: {")
+    ]
+    assert chunks[0]["choices"][0]["text"] == "Partial answer"
+    assert chunks[-1]["error"]["message"] == "Connection lost"
+    assert chunks[-1]["usage"]["completion_tokens"] == count_tokens("Partial answer")
+    assert response.text.endswith("data: [DONE]\n\n")
+
+
+@pytest.mark.asyncio
+async def test_coalesce_texts():
+    """Test that bursts are merged and idle gaps or errors flush the buffer"""
+    from server import coalesce_texts
+
+    async def texts():
+        yield "a"
+        yield "b"
+        await asyncio.sleep(0.05)
+        yield "c" * 300
+        yield "d"
+        raise Exception("Connection lost")
+
+    received = []
+    with pytest.raises(Exception, match="Connection lost"):
+        async for text in coalesce_texts(texts()):
+            received.append(text)
+
+    assert received == ["ab", "c" * 300, "d"]
 
 
 def test_models_endpoint(client):
@@ -222,6 +523,13 @@ def test_models_endpoint(client):
     assert "GPT-4o" in model_ids
 
 
+def test_models_endpoint_cached(client):
+    first = client.get("/v1/models")
+    second = client.get("/models")
+    assert first.headers["content-type"] == "application/json"
+    assert first.content == second.content
+
+
 def test_openapi_endpoint(client):
     response = client.get("/openapi.json")
     assert response.status_code == 200
@@ -233,6 +541,38 @@ def test_openapi_endpoint(client):
 def test_root_endpoint(client):
     response = client.get("/")
     assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+
+    etag = response.headers["etag"]
+    cached = client.get("/", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    for if_none_match in [f"W/{etag}", f'"other", {etag}', "*"]:
+        response = client.get("/", headers={"If-None-Match": if_none_match})
+        assert response.status_code == 304
+    assert client.get("/", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_path_normalization(client):
+    for path in ["/v1/models", "//v1/models", "/v1//models"]:
+        assert client.get(path).status_code == 200
+    assert client.get("/v1/").status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_global_exception_handler_server_error():
+    from server import global_exception_handler
+
+    response = await global_exception_handler(None, ValueError('bad "input"'))
+    assert response.status_code == 500
+    assert response.headers["content-type"] == "application/json"
+    assert json.loads(response.body) == {
+        "error": {
+            "message": 'An unexpected error occurred: bad "input"',
+            "type": "server_error",
+        }
+    }
 
 
 def test_complex_message_content(client, mock_get_bot_response):
@@ -274,6 +614,28 @@ def test_is_replace_response_functionality(client, mock_get_bot_response_with_re
     assert response_data["choices"][0]["message"]["content"] == "replacement text"
 
 
+def test_is_replace_response_streaming_usage(
+    client, mock_get_bot_response_with_replace
+):
+    """Test that replaced text is not counted in streamed completion tokens"""
+    request_data = {
+        "model": "Claude-3.5-Sonnet",
+        "messages": [{"role": "user", "content": "Test replacement"}],
+        "stream": True,
+    }
+    headers = {"Authorization": "Bearer test_api_key"}
+
+    response = client.post("/v1/chat/completions", json=request_data, headers=headers)
+    assert response.status_code == 200
+    chunks = [
+        json.loads(line[len("data: ") :])
+        for line in response.text.splitlines()
+        if line.startswith("data: {")
+    ]
+    usage = chunks[-1]["usage"]
+    assert usage["completion_tokens"] == count_tokens("replacement text")
+
+
 def test_base64_image_support(client, mock_get_bot_response):
     """Test handling of base64 encoded images"""
     # Simple base64 encoded 1x1 pixel PNG
@@ -673,6 +1035,27 @@ def test_image_url_integration(mock_upload_file, client, mock_get_bot_response):
     assert call_kwargs["file_url"] == "https://example.com/test-image.jpg"
 
 
+@pytest.mark.asyncio
+async def test_uploads_keep_shared_http_client_open(mock_transport):
+    """Test that uploads never close the app-wide HTTP client"""
+    import server
+    from server import upload_file_bytes
+
+    with patch.object(
+        server, "http_client", _REAL_ASYNC_CLIENT(transport=mock_transport)
+    ):
+        attachments = await asyncio.gather(
+            upload_file_bytes(b"first", "image/png", "test_api_key"),
+            upload_file_bytes(b"second", "image/png", "test_api_key"),
+        )
+        assert [a.url for a in attachments] == ["https://poe.com/uploaded.png"] * 2
+
+        assert not server.http_client.is_closed
+        response = await server.http_client.get("https://poe.com/uploaded.png")
+        assert response.content == b"fake_image_data"
+        await server.http_client.aclose()
+
+
 def test_file_upload_failure_fallback(client, mock_get_bot_response):
     """Test that the system falls back gracefully when file upload fails"""
     with patch("fastapi_poe.upload_file", side_effect=Exception("Upload failed")):
@@ -775,6 +1158,68 @@ def test_content_conversion_functions():
     assert not invalid_data_url.startswith("data:")
 
 
+@pytest.mark.asyncio
+async def test_process_base64_image(mock_all_external_calls):
+    from server import process_base64_image
+
+    mock_upload = mock_all_external_calls["upload_file"]
+
+    await process_base64_image("data:image/webp;base64,aGVsbG8=", "test_api_key")
+    mock_upload.assert_called_once_with(
+        file=b"hello",
+        file_name="uploaded_file.webp",
+        api_key="test_api_key",
+    )
+
+    with pytest.raises(ValueError):
+        await process_base64_image("data:image/webp,aGVsbG8=", "test_api_key")
+
+
+@pytest.mark.asyncio
+async def test_convert_content_uploads_concurrently():
+    """Test that images upload concurrently and keep their place in the text"""
+    from server import convert_openai_content_to_poe
+
+    started = []
+    release = asyncio.Event()
+
+    async def mock_upload(file=None, file_name=None, file_url=None, api_key=None):
+        started.append(file_url or file_name)
+        if len(started) == 3:
+            release.set()
+        await release.wait()
+        if file_url == "https://example.com/broken.jpg":
+            raise Exception("Upload failed")
+        return fp.Attachment(
+            url="https://poe.com/attachment",
+            content_type="image/jpeg",
+            name=file_url.rsplit("/", 1)[-1] if file_url else file_name,
+        )
+
+    content = [
+        {"type": "text", "text": "First"},
+        {"type": "image_url", "image_url": {"url": "https://example.com/a.jpg"}},
+        {"type": "text", "text": "then"},
+        {"type": "image_url", "image_url": {"url": "https://example.com/broken.jpg"}},
+        {"type": "image", "image_url": "data:image/png;base64,aGVsbG8="},
+    ]
+
+    with patch("fastapi_poe.upload_file", side_effect=mock_upload):
+        text, attachments = await asyncio.wait_for(
+            convert_openai_content_to_poe(content, "test_api_key"), timeout=1
+        )
+
+    assert text == (
+        "First [Image from URL: a.jpg] then "
+        "[Image (upload failed): https://example.com/broken.jpg] "
+        "[Uploaded Image: uploaded_file.png]"
+    )
+    assert [attachment.name for attachment in attachments] == [
+        "a.jpg",
+        "uploaded_file.png",
+    ]
+
+
 def test_supported_mime_types():
     """Test MIME type to extension mapping"""
     extension_map = {
@@ -1021,15 +1466,65 @@ def test_image_generations_b64_json(client, mock_all_external_calls):
     mock_all_external_calls["bot_response"].side_effect = mock_response_generator
 
     # HTTP client is already mocked by mock_all_external_calls
-    mock_all_external_calls[
-        "http_client"
-    ].return_value.__aenter__.return_value.get.return_value.content = b"fake_image_data"
+    mock_all_external_calls["http_response"].content = b"fake_image_data"
 
     response = client.post("/v1/images/generations", json=request_data, headers=headers)
     assert response.status_code == 200
     response_data = response.json()
     assert "data" in response_data
     assert "b64_json" in response_data["data"][0]
+    assert base64.b64decode(response_data["data"][0]["b64_json"]) == b"fake_image_data"
+
+
+def test_image_generations_b64_json_after_upload(
+    transport_client, mock_all_external_calls
+):
+    headers = {"Authorization": "Bearer test_api_key"}
+    chat_request = {
+        "model": "gpt-4o",
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": "data:image/png;base64,aGVsbG8="},
+                    },
+                ],
+            }
+        ],
+    }
+    response = transport_client.post(
+        "/v1/chat/completions", json=chat_request, headers=headers
+    )
+    assert response.status_code == 200
+    attachments = (
+        mock_all_external_calls["bot_response"]
+        .call_args.kwargs["messages"][-1]
+        .attachments
+    )
+    assert [a.url for a in attachments] == ["https://poe.com/uploaded.png"]
+
+    async def mock_response_generator(*args, **kwargs):
+        yield fp.PartialResponse(
+            text="Here's your image:",
+            attachment=fp.Attachment(
+                url="https://poe.com/image.png", content_type="image/png", name="a.png"
+            ),
+        )
+
+    mock_all_external_calls["bot_response"].side_effect = mock_response_generator
+    image_request = {
+        "prompt": "A beautiful sunset",
+        "model": "Imagen-3-Fast",
+        "response_format": "b64_json",
+    }
+    response = transport_client.post(
+        "/v1/images/generations", json=image_request, headers=headers
+    )
+    assert response.status_code == 200
+    b64_json = response.json()["data"][0]["b64_json"]
+    assert base64.b64decode(b64_json) == b"fake_image_data"
 
 
 def test_image_edits_endpoint(client, mock_all_external_calls):
@@ -1068,6 +1563,40 @@ def test_image_edits_endpoint(client, mock_all_external_calls):
     assert len(response_data["data"]) == 1
     assert response_data["data"][0]["url"] == "https://poe.com/edited_image.jpg"
 
+    upload_kwargs = mock_all_external_calls["upload_file"].call_args.kwargs
+    assert upload_kwargs["file"] == mock_image_content
+    assert upload_kwargs["file_name"] == "uploaded_file.jpg"
+
+
+def test_image_edits_b64_json(transport_client, mock_all_external_calls):
+    form_data = {
+        "prompt": "Make it more colorful",
+        "model": "Imagen-3-Fast",
+        "response_format": "b64_json",
+    }
+    files = {"image": ("test_image.jpg", b"original_image", "image/jpeg")}
+    headers = {"Authorization": "Bearer test_api_key"}
+
+    async def mock_response_generator(*args, **kwargs):
+        yield fp.PartialResponse(
+            text="Here's your edited image:",
+            attachment=fp.Attachment(
+                url="https://poe.com/edited.png", content_type="image/png", name="e.png"
+            ),
+        )
+
+    mock_all_external_calls["bot_response"].side_effect = mock_response_generator
+
+    response = transport_client.post(
+        "/v1/images/edits", data=form_data, files=files, headers=headers
+    )
+    assert response.status_code == 200
+    b64_json = response.json()["data"][0]["b64_json"]
+    assert base64.b64decode(b64_json) == b"fake_image_data"
+
+    messages = mock_all_external_calls["bot_response"].call_args.kwargs["messages"]
+    assert messages[-1].content.endswith("[Uploaded Image: uploaded_file.jpg]")
+
 
 def test_image_edits_multiple_images(client, mock_all_external_calls):
     # Create mock image file content
@@ -1108,6 +1637,34 @@ def test_image_edits_multiple_images(client, mock_all_external_calls):
         assert item["url"] == "https://poe.com/edited_image.jpg"
 
 
+def test_image_generations_partial_failure(client, mock_all_external_calls):
+    request_data = {"prompt": "A beautiful sunset", "n": 3}
+    headers = {"Authorization": "Bearer test_api_key"}
+    calls = []
+
+    async def mock_response_generator(*args, **kwargs):
+        calls.append(None)
+        if len(calls) == 2:
+            raise Exception("Generation failed")
+        mock_message = MagicMock()
+        mock_message.text = ""
+        mock_message.attachment = fp.Attachment(
+            url=f"https://poe.com/image{len(calls)}.jpg",
+            content_type="image/jpeg",
+            name="image.jpg",
+        )
+        yield mock_message
+
+    mock_all_external_calls["bot_response"].side_effect = mock_response_generator
+
+    response = client.post("/v1/images/generations", json=request_data, headers=headers)
+    assert response.status_code == 200
+    assert [item["url"] for item in response.json()["data"]] == [
+        "https://poe.com/image1.jpg",
+        "https://poe.com/image3.jpg",
+    ]
+
+
 def test_image_generations_no_file(client, mock_all_external_calls):
     request_data = {"prompt": "A beautiful sunset", "model": "Imagen-3-Fast"}
     headers = {"Authorization": "Bearer test_api_key"}